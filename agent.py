@@ -1,10 +1,10 @@
 """
 智能体模块 - 问题分析与拆解智能体（使用 LangChain 官方 Agent API）
 """
-import json
+import orjson
 from typing import Dict, Any
 from config import Config
-from tools import ComplexityCheckTool, ProblemDecomposeTool
+from tools import CombinedAnalysisTool
 from react_agent import ReActAgent
 
 
@@ -48,72 +48,63 @@ class ReActQuestionDecomposeAgent:
 class SimpleQuestionDecomposeAgent:
     """
     简化版问题分析与拆解智能体（直接调用工具）
-    
-    适用于需要更直接控制的场景
+
+    适用于需要更直接控制的场景。复杂度判断与问题拆解
+    合并为一次 LLM 调用，比两步串行少一次完整往返。
     """
-    
+
     def __init__(self):
         self.llm = Config.get_qwen_model(temperature=0.3)
-        self.complexity_tool = ComplexityCheckTool()
-        self.decompose_tool = ProblemDecomposeTool()
-    
+        self.combined_tool = CombinedAnalysisTool()
+
     def process(self, query: str) -> Dict[str, Any]:
         """
         处理用户问题
-        
+
         Args:
             query: 用户原始问题
-            
+
         Returns:
             Dict: 包含分析结果的字典
         """
-        # 第一步：判断复杂度
-        print(f"正在分析问题复杂度: {query}")
-        complexity_result_str = self.complexity_tool._run(query)
-        
+        # 一次调用同时完成复杂度判断和问题拆解
+        print(f"正在分析问题: {query}")
+        analysis_result_str = self.combined_tool.invoke({"query": query})
+
         try:
-            complexity_result = json.loads(complexity_result_str)
-        except json.JSONDecodeError:
-            complexity_result = {
+            analysis_result = orjson.loads(analysis_result_str)
+        except orjson.JSONDecodeError:
+            analysis_result = {
                 'is_complex': False,
                 'reason': '解析失败',
-                'indicators': []
+                'indicators': [],
+                'sub_problems': []
             }
-        
-        is_complex = complexity_result.get('is_complex', False)
-        
-        # 第二步：如果是复杂问题，进行拆解
-        sub_problems = []
+
+        is_complex = analysis_result.get('is_complex', False)
+        sub_problems = analysis_result.get('sub_problems', [])
+
         if is_complex:
-            print(f"检测到复杂问题，正在进行拆解...")
-            decompose_result_str = self.decompose_tool._run(query)
-            try:
-                decompose_result = json.loads(decompose_result_str)
-                sub_problems = decompose_result.get('sub_problems', [])
-            except json.JSONDecodeError:
-                sub_problems = [{
-                    'id': 1,
-                    'content': query,
-                    'type': '原始问题',
-                    'dependencies': []
-                }]
+            print(f"检测到复杂问题，已完成拆解")
         else:
             print(f"简单问题，无需拆解")
+
+        if not sub_problems:
             sub_problems = [{
                 'id': 1,
                 'content': query,
-                'type': '简单问题',
+                'type': '简单问题' if not is_complex else '原始问题',
                 'dependencies': []
             }]
-        
+
         # 返回最终结果
         return {
             'original_query': query,
             'is_complex': is_complex,
             'sub_problems': sub_problems,
             'complexity_analysis': {
-                'reason': complexity_result.get('reason', ''),
-                'indicators': complexity_result.get('indicators', [])
+                'reason': analysis_result.get('reason', ''),
+                'indicators': analysis_result.get('indicators', [])
             }
         }
 
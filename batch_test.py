@@ -2,160 +2,570 @@
 批量测试脚本 - 读取测试用例，运行智能体预测，计算准确率
 使用 ReAct Agent 进行复杂度判定
 """
+import asyncio
+import contextlib
 import csv
-import json
+import io
+import math
+import sys
 import time
 import datetime
+from statistics import NormalDist
+import orjson
+from aiolimiter import AsyncLimiter
+import numpy as np
+import pandas as pd
 from typing import List, Dict, Tuple
+from config import Config, aclose_async_http_client
+from result_cache import disable_cache
 from react_agent import ReActAgent
+from tools import ComplexityCheckTool, build_complexity_prompt
+
+# 长度分桶调度的桶数
+N_BINS = 4
+
+# 流式写结果 / 刷新 stdout 的行间隔
+FLUSH_EVERY = 10
+
+# 结果 CSV 的列
+RESULT_FIELDNAMES = ['question', 'expected', 'predicted', 'is_correct',
+                     'is_complex', 'reason', 'indicators']
+
+
+class _SequentialStopper:
+    """
+    序贯检验早停器（Wilson 置信区间）
+
+    每完成一个样本就更新运行准确率的置信区间：区间整体高于目标
+    准确率即可提前判定通过，整体低于则判定不通过，都不再消耗剩余
+    样本的 LLM 调用。对明显好/坏的提示词，通常 ~30 个样本即可停。
+    """
+
+    def __init__(self, target_accuracy: float, confidence: float = 0.95,
+                 min_samples: int = 20):
+        self.target = target_accuracy
+        self.min_samples = min_samples
+        self._z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+        self.correct = 0
+        self.total = 0
+
+    def update(self, is_correct: bool):
+        """
+        更新统计并判定是否可以停止
+
+        Args:
+            is_correct: 本样本是否预测正确
+
+        Returns:
+            str: 'success'（区间整体高于目标）/ 'failure'（整体低于），
+                 尚无法判定时返回 None
+        """
+        self.correct += 1 if is_correct else 0
+        self.total += 1
+        if self.total < self.min_samples:
+            return None
+
+        low, high = self._wilson_interval()
+        if low > self.target:
+            return 'success'
+        if high < self.target:
+            return 'failure'
+        return None
+
+    def _wilson_interval(self):
+        """当前运行准确率的 Wilson 置信区间"""
+        n = self.total
+        p = self.correct / n
+        z = self._z
+        denom = 1 + z * z / n
+        centre = (p + z * z / (2 * n)) / denom
+        margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denom
+        return centre - margin, centre + margin
+
+
+class _ResultWriter:
+    """
+    流式 CSV 结果写入器
+
+    每完成一个测试用例立刻写一行，每 FLUSH_EVERY 行刷盘一次：
+    中途崩溃或 Ctrl-C 时已完成的结果都在磁盘上，顺带把 stdout
+    的刷新也降到每 FLUSH_EVERY 行一次。
+    """
+
+    def __init__(self, output_file: str):
+        self._f = open(output_file, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._f, fieldnames=RESULT_FIELDNAMES)
+        self._writer.writeheader()
+        self._rows = 0
+
+    def write(self, result: Dict):
+        """写入一条结果记录"""
+        self._writer.writerow({
+            'question': result['question'],
+            'expected': result['expected'],
+            'predicted': result['predicted'],
+            'is_correct': result['is_correct'],
+            'is_complex': 1 if result.get('is_complex', False) else 0,
+            'reason': result.get('reason', ''),
+            'indicators': ','.join(result.get('indicators') or [])
+        })
+        self._rows += 1
+        if self._rows % FLUSH_EVERY == 0:
+            self._f.flush()
+            sys.stdout.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def _estimate_tokens(question: str) -> int:
+    """
+    粗略估计单个测试用例的 token 开销（prompt + 预期 decode）
+
+    Args:
+        question: 测试问题
+
+    Returns:
+        int: 估计的 token 数（廉价代理，仅用于排序分桶）
+    """
+    return len(question) // 3 + 256
 
 
 def load_test_cases(csv_file: str) -> List[Dict]:
     """
     加载测试用例
-    
+
+    使用 pandas 的 C 解析器整列加载，避免逐行构建 Python 字典。
+
     Args:
         csv_file: CSV文件路径
-        
+
     Returns:
         List[Dict]: 测试用例列表
     """
-    test_cases = []
-    with open(csv_file, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
-        # 打印列名用于调试
-        print(f"CSV列名: {reader.fieldnames}")
-        
-        for row in reader:
-            # 去除列名中的空格和BOM
-            row_cleaned = {k.strip().replace('\ufeff', ''): v for k, v in row.items()}
-            
-            try:
-                test_cases.append({
-                    'question': row_cleaned.get('question', ''),
-                    'is_complexity': int(row_cleaned.get('is_complexity', 0)),
-                    'human_eval': int(row_cleaned.get('hunman_eval', 0))
-                })
-            except (KeyError, ValueError) as e:
-                print(f"解析行出错: {e}, 行数据: {row_cleaned}")
-                continue
-    return test_cases
+    df = pd.read_csv(csv_file, encoding='utf-8-sig')
+
+    # 去除列名中的空格和BOM
+    df.columns = df.columns.str.strip().str.replace('\ufeff', '')
+    # 打印列名用于调试
+    print(f"CSV列名: {list(df.columns)}")
+
+    # 源文件中列名拼写为 hunman_eval
+    df = df.rename(columns={'hunman_eval': 'human_eval'})
+    df = df[['question', 'is_complexity', 'human_eval']]
+
+    # 整列数值化，无法解析的行直接丢弃（与原先逐行跳过一致）
+    df['is_complexity'] = pd.to_numeric(df['is_complexity'], errors='coerce')
+    df['human_eval'] = pd.to_numeric(df['human_eval'], errors='coerce')
+    bad_rows = df['is_complexity'].isna() | df['human_eval'].isna()
+    if bad_rows.any():
+        print(f"解析出错，跳过 {int(bad_rows.sum())} 行")
+        df = df[~bad_rows]
+
+    df['question'] = df['question'].fillna('')
+    df['is_complexity'] = df['is_complexity'].astype(int)
+    df['human_eval'] = df['human_eval'].astype(int)
 
+    return df.to_dict('records')
 
-def run_batch_test(test_cases: List[Dict], delay: float = 0.5) -> Tuple[List[Dict], float]:
+
+async def _classify_fast(tool: ComplexityCheckTool, question: str) -> Dict:
     """
-    批量运行测试 - 使用 ReAct Agent 进行复杂度判定
-    
+    快速路径：直接调用复杂度判断工具，跳过 ReAct 多轮开销
+
+    批量测试只需要 is_complex 用于准确率统计，sub_problems 并不使用，
+    一次 JSON 分类调用即可，单样本从 ≥3 次 HTTP 往返降到 1 次。
+
     Args:
-        test_cases: 测试用例列表
-        delay: 每次请求之间的延迟（秒）
-        
+        tool: 复杂度判断工具实例
+        question: 测试问题
+
     Returns:
-        Tuple[List[Dict], float]: (结果列表, 准确率)
+        Dict: 与 ReActAgent.aprocess 相同结构的结果
     """
-    # 用 ReAct Agent
-    agent = ReActAgent(temperature=0.3, verbose=False)
-    results = []
-    correct_count = 0
-    total_count = len(test_cases)
-    
-    print(f"开始批量测试，共 {total_count} 个测试用例...")
-    print("=" * 80)
-    
-    for i, test_case in enumerate[Dict](test_cases, 1):
-        question = test_case['question']
-        expected = test_case['human_eval']
-        
-        print(f"\n[{i}/{total_count}] 测试问题: {question}")
+    result = orjson.loads(await tool._arun(question))
+    return {
+        'original_query': question,
+        'is_complex': result.get('is_complex', False),
+        'sub_problems': [],
+        'complexity_analysis': {
+            'reason': result.get('reason', ''),
+            'indicators': result.get('indicators', [])
+        }
+    }
+
+
+async def _run_single_test(process_fn, test_case: Dict, index: int,
+                           total_count: int, semaphore: asyncio.Semaphore,
+                           limiter: AsyncLimiter = None,
+                           writer: _ResultWriter = None) -> Dict:
+    """
+    异步运行单个测试用例
+
+    Args:
+        process_fn: 异步处理函数，输入问题，返回分析结果字典
+        test_case: 测试用例
+        index: 测试用例序号（从1开始）
+        total_count: 测试用例总数
+        semaphore: 并发控制信号量
+        limiter: 可选的令牌桶限流器，仅在超出预算时等待
+        writer: 可选的流式结果写入器
+
+    Returns:
+        Dict: 结果记录
+    """
+    question = test_case['question']
+    expected = test_case['human_eval']
+
+    # 未设置限流时完全不等待，由信号量和服务端背压调节流量
+    rate_guard = limiter if limiter is not None else contextlib.nullcontext()
+
+    async with semaphore, rate_guard:
+        print(f"\n[{index}/{total_count}] 测试问题: {question}")
         print(f"预期结果: {'复杂问题' if expected == 1 else '简单问题'}")
-        
+
         try:
-            # 使用 ReAct Agent 处理问题
-            agent_result = agent.process(question)
-            
+            # 异步处理问题（完整 ReAct 或快速分类路径）
+            agent_result = await process_fn(question)
+
             # 从 Agent 返回结果中提取复杂度信息
             is_complex = agent_result.get('is_complex', False)
             reason = ''
             indicators = []
-            
+
             # 尝试从 complexity_analysis 中提取理由和指标
             if 'complexity_analysis' in agent_result:
                 analysis = agent_result['complexity_analysis']
                 reason = analysis.get('reason', '')
                 indicators = analysis.get('indicators', [])
-            
+
             # 转换为 0/1
             predicted = 1 if is_complex else 0
-            
+
             # 判断是否正确
             is_correct = (predicted == expected)
-            if is_correct:
-                correct_count += 1
-            
-            # 保存结果
-            result_record = {
+
+            print(f"预测结果: {'复杂问题' if predicted == 1 else '简单问题'} {'✓' if is_correct else '✗'}")
+            if reason:
+                print(f"判断理由: {reason[:50]}...")
+
+            record = {
                 'question': question,
                 'expected': expected,
                 'predicted': predicted,
                 'is_correct': is_correct,
                 'is_complex': is_complex,
                 'reason': reason,
-                'indicators': ','.join(indicators) if indicators else ''
+                # 保留原始列表，拼接推迟到写出阶段
+                'indicators': indicators
             }
-            results.append(result_record)
-            
-            print(f"预测结果: {'复杂问题' if predicted == 1 else '简单问题'} {'✓' if is_correct else '✗'}")
-            if reason:
-                print(f"判断理由: {reason[:50]}...")
-            
-            # 延迟，避免请求过快
-            if i < total_count:
-                time.sleep(delay)
-                
+
         except Exception as e:
             print(f"处理出错: {e}")
-            results.append({
+            record = {
                 'question': question,
                 'expected': expected,
                 'predicted': None,
                 'is_correct': False,
                 'error': str(e)
-            })
-    
+            }
+
+        # 完成即落盘，中断时已跑完的结果不会丢
+        if writer is not None:
+            writer.write(record)
+        return record
+
+
+async def _run_all_tests(process_fn, test_cases: List[Dict],
+                         concurrency: int, max_rps: float = None,
+                         writer: _ResultWriter = None,
+                         stopper: _SequentialStopper = None) -> List[Dict]:
+    """
+    并发运行所有测试用例（按估计长度分桶调度）
+
+    把短问题和长 ReAct 多轮请求混在同一并发窗口会导致批次被最长
+    请求拖尾。这里先按估计 token 数排序并分成 N_BINS 个桶，每个桶
+    单独 gather，桶内请求长度相近，尾部延迟显著降低；短桶用更宽的
+    并发，长桶收窄。结果按原始顺序返回。
+
+    Args:
+        process_fn: 异步处理函数，输入问题，返回分析结果字典
+        test_cases: 测试用例列表
+        concurrency: 最大并发请求数
+        max_rps: 可选的每秒请求数上限（令牌桶，允许突发）
+        writer: 可选的流式结果写入器
+        stopper: 可选的序贯检验早停器，判定达成即取消剩余样本
+
+    Returns:
+        List[Dict]: 已完成样本的结果列表（与输入顺序一致）
+    """
+    total_count = len(test_cases)
+    limiter = AsyncLimiter(max_rps, 1) if max_rps else None
+
+    # 按估计 token 数排序，记录原始下标以便最后恢复顺序
+    order = sorted(range(total_count),
+                   key=lambda idx: _estimate_tokens(test_cases[idx]['question']))
+    bin_size = (total_count + N_BINS - 1) // N_BINS
+
+    results: List[Dict] = [None] * total_count
+    for bin_no in range(N_BINS):
+        bin_indices = order[bin_no * bin_size:(bin_no + 1) * bin_size]
+        if not bin_indices:
+            continue
+
+        # 短桶（排在前面）并发更宽，长桶逐步收窄
+        bin_concurrency = max(1, concurrency * (N_BINS - bin_no) // N_BINS)
+        semaphore = asyncio.Semaphore(bin_concurrency)
+
+        async def _indexed(idx: int):
+            record = await _run_single_test(process_fn, test_cases[idx], idx + 1,
+                                            total_count, semaphore, limiter, writer)
+            return idx, record
+
+        bin_start = time.perf_counter()
+        tasks = [asyncio.create_task(_indexed(idx)) for idx in bin_indices]
+
+        verdict = None
+        for fut in asyncio.as_completed(tasks):
+            idx, record = await fut
+            results[idx] = record
+            if stopper is not None and record.get('predicted') is not None:
+                verdict = stopper.update(record['is_correct'])
+                if verdict:
+                    break
+
+        if verdict:
+            # 结论已有统计显著性，取消还在排队/进行的请求
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            print(f"\n序贯检验提前结束（{stopper.total} 个样本后判定"
+                  f"{'达到' if verdict == 'success' else '未达到'}目标准确率 "
+                  f"{stopper.target:.0%}）")
+            break
+
+        bin_elapsed = time.perf_counter() - bin_start
+        print(f"\n-- 桶 {bin_no + 1}/{N_BINS}: {len(bin_indices)} 个用例, "
+              f"并发 {bin_concurrency}, 耗时 {bin_elapsed:.1f}s --")
+
+    # 提前退出时只返回已完成的样本
+    return [r for r in results if r is not None]
+
+
+def run_batch_test(test_cases: List[Dict], concurrency: int = 16,
+                   fast: bool = False, max_rps: float = None,
+                   output_file: str = None,
+                   temperature: float = 0.0,
+                   stopper: _SequentialStopper = None) -> Tuple[List[Dict], float]:
+    """
+    批量运行测试 - 使用 ReAct Agent 或快速分类路径进行复杂度判定
+
+    多个测试用例通过 asyncio 并发发起请求，墙钟时间约为
+    ceil(N/concurrency) × 单次延迟，而不是 N × 单次延迟。
+
+    Args:
+        test_cases: 测试用例列表
+        concurrency: 最大并发请求数（避免压垮 vLLM 后端）
+        fast: True 时跳过 ReAct 框架，单次分类调用判定复杂度
+        max_rps: 可选的每秒请求数上限，不设置则不限流
+        output_file: 可选的结果CSV路径，设置后边跑边写（断点可续）
+        temperature: ReAct 路径的温度，默认 0（贪心解码，结果可复现）
+        stopper: 可选的序贯检验早停器
+
+    Returns:
+        Tuple[List[Dict], float]: (结果列表, 准确率)
+    """
+    if fast:
+        # 快速路径：单次 JSON 分类调用
+        tool = ComplexityCheckTool()
+        process_fn = lambda question: _classify_fast(tool, question)
+    else:
+        # 完整 ReAct 路径（用于回归对比）
+        agent = ReActAgent(temperature=temperature, verbose=False)
+        process_fn = agent.aprocess
+
+    total_count = len(test_cases)
+
+    print(f"开始批量测试，共 {total_count} 个测试用例"
+          f"（并发数: {concurrency}, 模式: {'快速分类' if fast else 'ReAct'}）...")
+    print("=" * 80)
+
+    # 关闭逐行刷新，减少高频 print 的系统调用；
+    # 每 FLUSH_EVERY 行随结果落盘一起手动 flush
+    old_stdout = sys.stdout
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding=old_stdout.encoding,
+                                  line_buffering=False, write_through=False)
+
+    writer = _ResultWriter(output_file) if output_file else None
+
+    async def _run_and_cleanup():
+        # 共享异步连接池绑定本事件循环，必须在循环退出前关闭，
+        # 否则 atexit 里另起新循环 aclose 会报 "Event loop is closed"
+        try:
+            return await _run_all_tests(process_fn, test_cases, concurrency,
+                                        max_rps=max_rps, writer=writer,
+                                        stopper=stopper)
+        finally:
+            await aclose_async_http_client()
+
+    try:
+        results = asyncio.run(_run_and_cleanup())
+    except KeyboardInterrupt:
+        if output_file:
+            print(f"\n已中断，已完成的结果在: {output_file}")
+        sys.stdout.flush()
+        raise SystemExit(1)
+    finally:
+        if writer is not None:
+            writer.close()
+        sys.stdout.flush()
+        # 先 detach 再还原：否则包装器被回收时会连带关闭共享的
+        # stdout.buffer，后续所有 print 直接报 I/O 错误
+        sys.stdout.detach()
+        sys.stdout = old_stdout
+
+    if output_file:
+        print(f"\n结果已保存到: {output_file}")
+
+    correct_count = sum(1 for r in results if r['is_correct'])
+
+    # 提前退出时按实际完成的样本数计算
+    completed_count = len(results)
+    accuracy = correct_count / completed_count if completed_count > 0 else 0
+
+    print("\n" + "=" * 80)
+    print(f"测试完成！")
+    print(f"总样本数: {total_count}, 完成数: {completed_count}")
+    print(f"正确数: {correct_count}")
+    print(f"准确率: {accuracy:.2%}")
+
+    return results, accuracy
+
+
+def run_batch_test_batched(test_cases: List[Dict],
+                           batch_size: int = 32) -> Tuple[List[Dict], float]:
+    """
+    批量运行测试 - 多 prompt 打包成单次 /v1/completions 请求
+
+    vLLM 的 OpenAI 兼容端点接受 prompt 数组：每 batch_size 个分类
+    prompt 打包成一次 HTTP 调用，服务端在一个 prefill 批次内执行，
+    HTTP 往返次数降为 1/batch_size。分类 prompt 共享不变前缀，
+    配合 --enable-prefix-caching 接近最优。
+
+    Args:
+        test_cases: 测试用例列表
+        batch_size: 每次请求打包的 prompt 数量
+
+    Returns:
+        Tuple[List[Dict], float]: (结果列表, 准确率)
+    """
+    from openai import OpenAI
+
+    client = OpenAI(api_key=Config.QWEN_API_KEY, base_url=Config.QWEN_BASE_URL)
+    total_count = len(test_cases)
+    results = []
+
+    print(f"开始批量测试，共 {total_count} 个测试用例"
+          f"（多 prompt 打包，每批 {batch_size} 个）...")
+    print("=" * 80)
+
+    for start in range(0, total_count, batch_size):
+        chunk = test_cases[start:start + batch_size]
+        prompts = [build_complexity_prompt(tc['question']) for tc in chunk]
+
+        try:
+            completion = client.completions.create(
+                model=Config.QWEN_MODEL,
+                prompt=prompts,
+                max_tokens=128,
+                temperature=0.0,
+            )
+        except Exception as e:
+            # 单个批次的瞬时失败只降级为该批次内的错误记录，
+            # 不中断运行，已完成批次的结果照常保留
+            print(f"[{start + 1}-{start + len(chunk)}/{total_count}] 批次请求出错: {e}")
+            for test_case in chunk:
+                results.append({
+                    'question': test_case['question'],
+                    'expected': test_case['human_eval'],
+                    'predicted': None,
+                    'is_correct': False,
+                    'error': str(e)
+                })
+            continue
+
+        # choices 按 index 对应输入 prompt 的顺序
+        texts = [''] * len(chunk)
+        for choice in completion.choices:
+            texts[choice.index] = choice.text
+
+        for i, (test_case, text) in enumerate(zip(chunk, texts), start + 1):
+            question = test_case['question']
+            expected = test_case['human_eval']
+
+            try:
+                parsed = orjson.loads(text)
+                is_complex = parsed.get('is_complex', False)
+                predicted = 1 if is_complex else 0
+                is_correct = (predicted == expected)
+                indicators = parsed.get('indicators', [])
+
+                results.append({
+                    'question': question,
+                    'expected': expected,
+                    'predicted': predicted,
+                    'is_correct': is_correct,
+                    'is_complex': is_complex,
+                    'reason': parsed.get('reason', ''),
+                    'indicators': indicators
+                })
+                print(f"[{i}/{total_count}] {question} -> "
+                      f"{'复杂' if predicted == 1 else '简单'} {'✓' if is_correct else '✗'}")
+
+            except orjson.JSONDecodeError as e:
+                print(f"[{i}/{total_count}] 解析出错: {e}")
+                results.append({
+                    'question': question,
+                    'expected': expected,
+                    'predicted': None,
+                    'is_correct': False,
+                    'error': str(e)
+                })
+
+    correct_count = sum(1 for r in results if r['is_correct'])
     accuracy = correct_count / total_count if total_count > 0 else 0
-    
+
     print("\n" + "=" * 80)
     print(f"测试完成！")
     print(f"总样本数: {total_count}")
     print(f"正确数: {correct_count}")
     print(f"准确率: {accuracy:.2%}")
-    
+
     return results, accuracy
 
 
 def save_results(results: List[Dict], output_file: str):
     """
     保存测试结果到CSV
-    
+
+    结果按列组装成 DataFrame（SoA），indicators 的拼接和 CSV 编码
+    都走 pandas 的向量化路径单趟完成，避免逐行小字符串分配。
+
     Args:
         results: 结果列表
         output_file: 输出文件路径
     """
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['question', 'expected', 'predicted', 'is_correct', 
-                      'is_complex', 'reason', 'indicators']
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for result in results:
-            writer.writerow({
-                'question': result['question'],
-                'expected': result['expected'],
-                'predicted': result['predicted'],
-                'is_correct': result['is_correct'],
-                'is_complex': 1 if result.get('is_complex', False) else 0,
-                'reason': result.get('reason', ''),
-                'indicators': result.get('indicators', '')
-            })
+    df = pd.DataFrame(results, columns=RESULT_FIELDNAMES)
+    # 出错样本的 predicted 为 None，会把整列升格为 float 写出 1.0/0.0；
+    # 可空 Int64 保持 1/0 的输出格式不变
+    df['predicted'] = df['predicted'].astype('Int64')
+    df['is_complex'] = df['is_complex'].fillna(False).astype(bool).astype(int)
+    df['reason'] = df['reason'].fillna('')
+    # 逐元素拼接：列里可能混有 NaN（出错样本没有 indicators），
+    # 全部缺失时列是 float dtype，.str 访问器会直接抛 AttributeError
+    df['indicators'] = df['indicators'].apply(
+        lambda v: ','.join(v) if isinstance(v, list) else '')
+    df.to_csv(output_file, index=False)
     print(f"\n结果已保存到: {output_file}")
 
 
@@ -181,10 +591,17 @@ def print_confusion_matrix(results: List[Dict]):
     Args:
         results: 结果列表
     """
-    tp = sum(1 for r in results if r['expected'] == 1 and r['predicted'] == 1)
-    tn = sum(1 for r in results if r['expected'] == 0 and r['predicted'] == 0)
-    fp = sum(1 for r in results if r['expected'] == 0 and r['predicted'] == 1)
-    fn = sum(1 for r in results if r['expected'] == 1 and r['predicted'] == 0)
+    # 一次遍历构建两个连续 int 数组，混淆矩阵用 bincount 单趟统计
+    # （predicted 为 None 的出错样本编码为 -1，不计入任何象限）
+    expected = np.fromiter((r['expected'] for r in results),
+                           dtype=np.int8, count=len(results))
+    predicted = np.fromiter((r['predicted'] if r['predicted'] is not None else -1
+                             for r in results),
+                            dtype=np.int8, count=len(results))
+
+    valid = predicted >= 0
+    counts = np.bincount(expected[valid] * 2 + predicted[valid], minlength=4)
+    tn, fp, fn, tp = (int(c) for c in counts[:4])
     
     print("\n" + "=" * 80)
     print("混淆矩阵:")
@@ -207,7 +624,15 @@ def print_confusion_matrix(results: List[Dict]):
 def main():
     """主函数"""
     import argparse
-    
+
+    # uvloop 事件循环显著降低高并发下的调度开销（仅类 Unix 平台可用）
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
+
     parser = argparse.ArgumentParser(description='批量测试问题复杂度判断智能体')
     parser.add_argument('--input', '-i', type=str, default='100_test_samples.csv',
                         help='输入CSV文件路径')
@@ -215,13 +640,34 @@ def main():
                         help='输出CSV文件路径')
     parser.add_argument('--accuracy-output', '-a', type=str, default=None,
                         help='准确率输出文件路径（默认为 output + _accuracy.txt）')
-    parser.add_argument('--delay', '-d', type=float, default=0.5,
-                        help='请求间隔延迟（秒）')
+    parser.add_argument('--concurrency', '-c', type=int, default=16,
+                        help='最大并发请求数')
+    parser.add_argument('--fast', action='store_true',
+                        help='快速路径：跳过 ReAct 框架，单次分类调用判定复杂度')
+    parser.add_argument('--batched', action='store_true',
+                        help='多 prompt 打包成单次 /v1/completions 请求')
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help='--batched 模式下每次请求打包的 prompt 数量')
+    parser.add_argument('--max-rps', type=float, default=None,
+                        help='每秒请求数上限（令牌桶限流，不设置则不限流）')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='关闭结果缓存，强制重新计算所有样本')
+    parser.add_argument('--temperature', '-t', type=float, default=0.0,
+                        help='采样温度（默认 0，贪心解码）')
+    parser.add_argument('--target-accuracy', type=float, default=None,
+                        help='目标准确率，设置后启用序贯检验提前结束')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='序贯检验的置信水平')
+    parser.add_argument('--min-samples', type=int, default=20,
+                        help='序贯检验判定前至少完成的样本数')
     parser.add_argument('--limit', '-l', type=int, default=None,
                         help='限制测试样本数量（用于快速测试）')
     
     args = parser.parse_args()
-    
+
+    if args.no_cache:
+        disable_cache()
+
     # 加载测试用例
     print(f"加载测试用例: {args.input}")
     test_cases = load_test_cases(args.input)
@@ -233,13 +679,27 @@ def main():
         print(f"限制测试样本数为: {args.limit}")
     
     # 运行批量测试
-    results, accuracy = run_batch_test(test_cases, delay=args.delay)
+    if args.batched:
+        results, accuracy = run_batch_test_batched(test_cases,
+                                                   batch_size=args.batch_size)
+    else:
+        stopper = None
+        if args.target_accuracy is not None:
+            stopper = _SequentialStopper(args.target_accuracy,
+                                         confidence=args.confidence,
+                                         min_samples=args.min_samples)
+        results, accuracy = run_batch_test(test_cases, concurrency=args.concurrency,
+                                           fast=args.fast, max_rps=args.max_rps,
+                                           output_file=args.output,
+                                           temperature=args.temperature,
+                                           stopper=stopper)
     
     # 打印混淆矩阵
     # print_confusion_matrix(results)
-    
-    # 保存结果
-    save_results(results, args.output)
+
+    # 批量打包模式的结果在最后统一写出；异步模式已边跑边写
+    if args.batched:
+        save_results(results, args.output)
     
     # 保存准确率
     if args.accuracy_output:
@@ -1,34 +1,18 @@
 """
 ReAct Agent 实现 - 使用 LangChain 1.x 官方 API
 """
-import json
-from typing import Dict, Any
+import orjson
+from typing import Dict, Any, Optional
 from langchain.agents import create_agent
 from config import Config
+from result_cache import get_cache
 from tools import get_tools
 
 
-class ReActAgent:
-    """
-    ReAct (Reasoning + Acting) Agent - 使用 LangChain 官方 API
-    
-    工作流程：
-    1. Thought（思考）: 分析当前情况，决定下一步行动
-    2. Action（行动）: 选择并执行工具
-    3. Observation（观察）: 观察工具返回的结果
-    4. 循环: 直到获得足够信息，给出最终答案
-    """
-    
-    def __init__(self, temperature: float = 0.3, verbose: bool = True):
-        self.llm = Config.get_qwen_model(temperature=temperature)
-        self.tools = get_tools()
-        self.agent = self._create_agent(verbose=verbose)
-    
-    def _create_agent(self, verbose: bool = True):
-        """创建 ReAct Agent - 使用 LangChain 1.x API"""
-        
-        # ReAct 系统提示词
-        system_prompt = """你是一个专业的问题分析与拆解助手。你的任务是根据用户的问题，判断其复杂度，并在必要时进行拆解。
+# ReAct 系统提示词模板（模块级常量）
+# 提示词内容完全静态（不含时间戳、随机示例等），保证每次请求发送的
+# 系统前缀逐字节一致，vLLM 开启 --enable-prefix-caching 后可直接复用 KV
+SYSTEM_PROMPT_TEMPLATE = """你是一个专业的问题分析与拆解助手。你的任务是根据用户的问题，判断其复杂度，并在必要时进行拆解。
 
 你有以下工具可以使用：
 
@@ -56,89 +40,282 @@ class ReActAgent:
 
 开始工作！"""
 
-        # 准备工具描述
-        tools_description = "\n\n".join([f"{tool.name}: {tool.description}" for tool in self.tools])
-        tool_names = ", ".join([tool.name for tool in self.tools])
-        
-        # 格式化系统提示词
-        formatted_system_prompt = system_prompt.format(
-            tools=tools_description,
-            tool_names=tool_names
-        )
-        
+# 工具列表是静态的，描述字符串与格式化后的系统提示词在导入时算好一次，
+# 不必每个 Agent 实例重复拼接，也保证 token 序列跨实例/跨运行完全一致
+_TOOLS = get_tools()
+TOOLS_DESCRIPTION = "\n\n".join(f"{tool.name}: {tool.description}" for tool in _TOOLS)
+TOOL_NAMES = ", ".join(tool.name for tool in _TOOLS)
+FORMATTED_SYSTEM_PROMPT = SYSTEM_PROMPT_TEMPLATE.format(
+    tools=TOOLS_DESCRIPTION,
+    tool_names=TOOL_NAMES
+)
+
+
+def _iter_balanced_objects(text: str):
+    """
+    迭代文本中所有顶层平衡的 {...} 片段
+
+    对象内部跟踪字符串与转义字符，嵌套花括号不会干扰边界判定。
+
+    Args:
+        text: 待扫描的文本
+
+    Yields:
+        str: 平衡的 JSON 对象候选片段
+    """
+    pos = 0
+    length = len(text)
+    while True:
+        start = text.find("{", pos)
+        if start < 0:
+            return
+
+        depth = 0
+        in_string = False
+        escaped = False
+        end = -1
+        for i in range(start, length):
+            ch = text[i]
+            if escaped:
+                escaped = False
+            elif in_string:
+                if ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    end = i
+                    break
+
+        if end < 0:
+            return
+        yield text[start:end + 1]
+        pos = end + 1
+
+
+def _extract_final_json(text: str) -> Optional[Dict]:
+    """
+    从 Agent 输出中精确提取 Final Answer 的 JSON
+
+    有 "Final Answer:" 标记时取最后一个标记之后的第一个平衡对象；
+    没有标记时，由于输出缓冲包含整个多轮 trace（Thought 里的 JSON
+    排在前面），取最后一个能成功解析的平衡对象，即最终消息的答案。
+    解析用 orjson 的 C 解析器。
+
+    Args:
+        text: Agent 的文本输出
+
+    Returns:
+        Optional[Dict]: 解析出的 JSON 对象，未找到或解析失败返回 None
+    """
+    marker_pos = text.rfind(_FinalAnswerDetector.FINAL_ANSWER_MARKER)
+    if marker_pos >= 0:
+        text = text[marker_pos + len(_FinalAnswerDetector.FINAL_ANSWER_MARKER):]
+        for fragment in _iter_balanced_objects(text):
+            try:
+                return orjson.loads(fragment)
+            except orjson.JSONDecodeError:
+                return None
+        return None
+
+    parsed = None
+    for fragment in _iter_balanced_objects(text):
+        try:
+            parsed = orjson.loads(fragment)
+        except orjson.JSONDecodeError:
+            continue
+    return parsed
+
+
+class _FinalAnswerDetector:
+    """
+    Final Answer JSON 的增量检测器
+
+    在流式输出上逐块扫描：出现 "Final Answer:" 之后开始跟踪花括号
+    深度（忽略字符串内部及转义字符），深度回到 0 即说明 JSON 已闭合，
+    可以立即中止生成，省掉模型后续的冗余解码。
+    """
+
+    FINAL_ANSWER_MARKER = "Final Answer:"
+
+    def __init__(self):
+        self._buffer = ""
+        self._seen_marker = False
+        self._seen_brace = False
+        self._brace_depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._scan_pos = 0
+
+    def feed(self, text: str) -> bool:
+        """
+        送入新的文本块
+
+        Args:
+            text: 新收到的文本块
+
+        Returns:
+            bool: Final Answer 的 JSON 是否已经闭合
+        """
+        self._buffer += text
+
+        if not self._seen_marker:
+            marker_pos = self._buffer.find(self.FINAL_ANSWER_MARKER)
+            if marker_pos < 0:
+                return False
+            self._seen_marker = True
+            self._scan_pos = marker_pos + len(self.FINAL_ANSWER_MARKER)
+
+        for ch in self._buffer[self._scan_pos:]:
+            if self._escaped:
+                self._escaped = False
+            elif self._in_string:
+                if ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{':
+                self._seen_brace = True
+                self._brace_depth += 1
+            elif ch == '}':
+                self._brace_depth -= 1
+
+        self._scan_pos = len(self._buffer)
+        return self._seen_brace and self._brace_depth == 0
+
+
+class ReActAgent:
+    """
+    ReAct (Reasoning + Acting) Agent - 使用 LangChain 官方 API
+    
+    工作流程：
+    1. Thought（思考）: 分析当前情况，决定下一步行动
+    2. Action（行动）: 选择并执行工具
+    3. Observation（观察）: 观察工具返回的结果
+    4. 循环: 直到获得足够信息，给出最终答案
+    """
+    
+    def __init__(self, temperature: float = 0.3, verbose: bool = True):
+        self.llm = Config.get_qwen_model(temperature=temperature)
+        self.temperature = temperature
+        self.tools = get_tools()
+        self.agent = self._create_agent(verbose=verbose)
+    
+    def _create_agent(self, verbose: bool = True):
+        """创建 ReAct Agent - 使用 LangChain 1.x API"""
+
         # 使用 LangChain 1.x 的 create_agent API
+        # 系统提示词为模块级常量，作为首条消息发送，与 vLLM 的前缀缓存对齐
         agent = create_agent(
             model=self.llm,
             tools=self.tools,
-            system_prompt=formatted_system_prompt
+            system_prompt=FORMATTED_SYSTEM_PROMPT
         )
-        
+
         return agent
     
     def process(self, query: str) -> Dict[str, Any]:
         """
         处理用户问题 - 使用 LangChain 1.x API
-        
+
         Args:
             query: 用户原始问题
-            
+
         Returns:
             Dict: 处理结果
         """
+        cache = get_cache()
+        cache_key = cache.make_key(FORMATTED_SYSTEM_PROMPT, query,
+                                   Config.QWEN_MODEL, self.temperature)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+
         try:
-            result = self.agent.invoke({
-                "messages": [{"role": "user", "content": query}]
-            })
-            
-            # 从结果中提取输出
+            # 流式消费输出，Final Answer JSON 闭合后立即中止生成，
+            # 省掉模型尾部的冗余解码（解释、额外轮次等）
             output = ""
-            if isinstance(result, dict):
-                output = result.get("output", "")
-                if not output and "messages" in result:
-                    messages = result["messages"]
-                    if messages:
-                        last_message = messages[-1]
-                        if hasattr(last_message, "content"):
-                            output = last_message.content
-                        elif isinstance(last_message, dict):
-                            output = last_message.get("content", "")
-            elif hasattr(result, "content"):
-                output = result.content
-            
-            # 尝试解析最终输出为 JSON
-            try:
-                # 尝试从输出中提取 Final Answer 后的 JSON
-                final_answer_marker = "Final Answer:"
-                if final_answer_marker in output:
-                    final_answer_start = output.find(final_answer_marker) + len(final_answer_marker)
-                    final_answer_text = output[final_answer_start:].strip()
-                    
-                    # 提取 Final Answer 中的 JSON
-                    json_start = final_answer_text.find("{")
-                    json_end = final_answer_text.rfind("}") + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = final_answer_text[json_start:json_end]
-                        parsed_result = json.loads(json_str)
-                        return self._format_final_result(query, parsed_result)
-                else:
-                    # 如果没有 Final Answer 标记，尝试直接提取 JSON
-                    json_start = output.find("{")
-                    json_end = output.rfind("}") + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_str = output[json_start:json_end]
-                        parsed_result = json.loads(json_str)
-                        return self._format_final_result(query, parsed_result)
-            except json.JSONDecodeError:
-                pass
-            
-            # 如果解析失败，返回原始输出
+            detector = _FinalAnswerDetector()
+            stream = self.agent.stream(
+                {"messages": [{"role": "user", "content": query}]},
+                stream_mode="messages"
+            )
+            for chunk, _metadata in stream:
+                text = getattr(chunk, "content", "") or ""
+                if not text:
+                    continue
+                output += text
+                if detector.feed(text):
+                    # 关闭生成器，取消后端还在进行的请求
+                    stream.close()
+                    break
+
+            result = self._parse_output(query, output)
+            # 只缓存成功解析的结果
+            if result.get('is_complex') is not None:
+                cache.put(cache_key, orjson.dumps(result).decode())
+            return result
+
+        except Exception as e:
             return {
                 "original_query": query,
                 "is_complex": None,
                 "sub_problems": [],
-                "raw_output": output
+                "error": str(e)
             }
-            
+
+    async def aprocess(self, query: str) -> Dict[str, Any]:
+        """
+        异步处理用户问题 - 供批量测试等并发场景使用
+
+        与 process 逻辑一致，但通过 ainvoke 发起请求，
+        多个问题可以在事件循环中并发等待网络 I/O。
+
+        Args:
+            query: 用户原始问题
+
+        Returns:
+            Dict: 处理结果
+        """
+        cache = get_cache()
+        cache_key = cache.make_key(FORMATTED_SYSTEM_PROMPT, query,
+                                   Config.QWEN_MODEL, self.temperature)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return orjson.loads(cached)
+
+        try:
+            # 与 process 相同的流式早停逻辑，走 astream
+            output = ""
+            detector = _FinalAnswerDetector()
+            stream = self.agent.astream(
+                {"messages": [{"role": "user", "content": query}]},
+                stream_mode="messages"
+            )
+            async for chunk, _metadata in stream:
+                text = getattr(chunk, "content", "") or ""
+                if not text:
+                    continue
+                output += text
+                if detector.feed(text):
+                    # 关闭生成器，取消后端还在进行的请求
+                    await stream.aclose()
+                    break
+
+            result = self._parse_output(query, output)
+            # 只缓存成功解析的结果
+            if result.get('is_complex') is not None:
+                cache.put(cache_key, orjson.dumps(result).decode())
+            return result
+
         except Exception as e:
             return {
                 "original_query": query,
@@ -146,6 +323,30 @@ class ReActAgent:
                 "sub_problems": [],
                 "error": str(e)
             }
+
+    def _parse_output(self, query: str, output: str) -> Dict[str, Any]:
+        """
+        解析 Agent 的文本输出为标准化结果
+
+        Args:
+            query: 原始问题
+            output: Agent 的文本输出
+
+        Returns:
+            Dict: 标准化格式的结果
+        """
+        # 花括号深度扫描精确定位 Final Answer 的 JSON 边界
+        parsed_result = _extract_final_json(output)
+        if parsed_result is not None:
+            return self._format_final_result(query, parsed_result)
+
+        # 如果解析失败，返回原始输出
+        return {
+            "original_query": query,
+            "is_complex": None,
+            "sub_problems": [],
+            "raw_output": output
+        }
     
     def _format_final_result(self, query: str, result: Dict) -> Dict[str, Any]:
         """
@@ -0,0 +1,79 @@
+"""
+结果缓存模块 - 基于 sqlite3 的持久化内容寻址缓存
+
+按 sha256(版本盐 + 提示词前缀 + 查询 + 模型 + 温度) 作键缓存 LLM 分析
+结果：重复/改写的测试样本以及重跑同一份测试集时，命中即字典查找，
+不再发起 LLM 调用。
+"""
+import functools
+import hashlib
+import sqlite3
+from pathlib import Path
+
+# 版本盐：提示词或解析逻辑变更时提升版本号，旧缓存自动失效
+CACHE_VERSION = "v1"
+
+_CACHE_PATH = Path(__file__).parent / ".complexity_cache.sqlite3"
+
+# 全局开关（--no-cache 时关闭）
+_enabled = True
+
+
+def disable_cache():
+    """关闭缓存（强制重新计算所有样本）"""
+    global _enabled
+    _enabled = False
+
+
+def cache_enabled() -> bool:
+    """缓存是否启用"""
+    return _enabled
+
+
+class ResultCache:
+    """sqlite3 持久化键值缓存"""
+
+    def __init__(self, path: Path = _CACHE_PATH):
+        self._conn = sqlite3.connect(str(path))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """
+        构建内容寻址的缓存键
+
+        Args:
+            parts: 参与寻址的内容片段（提示词、查询、模型、温度等）
+
+        Returns:
+            str: sha256 十六进制键
+        """
+        raw = "\x1f".join([CACHE_VERSION, *map(str, parts)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        """查询缓存，未命中或缓存关闭时返回 None"""
+        if not _enabled:
+            return None
+        row = self._conn.execute(
+            "SELECT value FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, value: str):
+        """写入缓存（缓存关闭时不写）"""
+        if not _enabled:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, value)
+        )
+        self._conn.commit()
+
+
+@functools.cache
+def get_cache() -> ResultCache:
+    """获取全局缓存实例（首次使用时创建）"""
+    return ResultCache()
@@ -0,0 +1,40 @@
+#!/usr/bin/env bash
+# 用 AutoAWQ 生成 INT4 (W4A16) 量化权重，供 vLLM 服务端加载。
+#
+# 用法:
+#   ./scripts/quantize.sh <源模型路径或HF名称> <输出目录>
+#
+# 生成后启动 vLLM:
+#   vllm serve <输出目录> --quantization awq --kv-cache-dtype fp8 \
+#       --enable-prefix-caching
+#
+# 客户端通过环境变量指向量化模型:
+#   export QWEN_MODEL_NAME=<输出目录对应的模型名>
+#   export QWEN_QUANTIZATION=awq
+set -euo pipefail
+
+MODEL_PATH="${1:?用法: quantize.sh <源模型> <输出目录>}"
+OUTPUT_DIR="${2:?用法: quantize.sh <源模型> <输出目录>}"
+
+python - "$MODEL_PATH" "$OUTPUT_DIR" <<'PY'
+import sys
+from awq import AutoAWQForCausalLM
+from transformers import AutoTokenizer
+
+model_path, output_dir = sys.argv[1], sys.argv[2]
+
+model = AutoAWQForCausalLM.from_pretrained(model_path)
+tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+
+# W4A16, group_size=128 是 AWQ 的常用配置，精度损失可忽略
+model.quantize(tokenizer, quant_config={
+    "zero_point": True,
+    "q_group_size": 128,
+    "w_bit": 4,
+    "version": "GEMM",
+})
+
+model.save_quantized(output_dir)
+tokenizer.save_pretrained(output_dir)
+print(f"量化权重已保存到: {output_dir}")
+PY
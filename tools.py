@@ -1,11 +1,99 @@
 """
 工具模块 - 包含问题复杂度判断工具和复杂问题拆解工具
 """
-import json
+import functools
+import orjson
 from typing import Dict, List, Any
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
 from config import Config
+from result_cache import get_cache
+
+
+# 各工具提示词的不变前缀（模块级常量）
+# 所有指令在前、用户查询严格置于末尾，保证跨请求的前缀逐字节一致，
+# 从而命中 vLLM 的 prefix caching，第2次起只需 prefill 变化的查询后缀
+
+_COMPLEXITY_PROMPT_PREFIX = """你是一个问题复杂度分析专家。请判断用户给出的问题是否为复杂问题。
+
+复杂问题的定义（满足以下任一条件即为复杂问题）：
+1. 包含多个子意图（如："帮我找北京的酒店和机票"）
+2. 需要推理或分析（如："为什么房价会上涨？"）
+3. 需要多步骤解决（如："如何从零开始学习Python并找到工作？"）
+4. 涉及因果关系或对比（如："比较Python和Java的优缺点"）
+5. 多款产品比较（如："iPhone 15和华为Mate 60哪个好？"）
+
+请以JSON格式输出分析结果，包含以下字段：
+- is_complex: true/false，表示是否为复杂问题
+- reason: 判断理由（详细说明为什么认为该问题是复杂或简单的）
+- indicators: 检测到的复杂特征列表（如["多子意图", "产品比较"]等，简单问题则为空列表）
+
+只输出JSON格式，不要包含其他说明文字。
+
+请分析以下问题：
+"""
+
+_DECOMPOSE_PROMPT_PREFIX = """你是一个问题拆解专家。请将用户给出的复杂问题拆解为多个可独立解决的子问题。
+
+拆解要求：
+1. 每个子问题应该是独立、具体的，可以单独回答
+2. 子问题之间可以有依赖关系（用dependencies字段标明）
+3. 子问题的顺序应该符合逻辑
+4. 确保拆解后的子问题能够完整回答原问题
+
+请以JSON格式输出拆解结果，格式如下：
+{
+    "sub_problems": [
+        {
+            "id": 1,
+            "content": "子问题内容",
+            "type": "信息查询/比较分析/推理判断/建议推荐",
+            "dependencies": []  // 依赖的子问题ID列表，无依赖则为空
+        }
+    ]
+}
+
+只输出JSON格式，不要包含其他说明文字。
+
+需要拆解的问题：
+"""
+
+_COMBINED_PROMPT_PREFIX = """你是一个问题分析专家。请在一次分析中完成两件事：判断用户给出的问题是否为复杂问题；如果是复杂问题，将其拆解为多个可独立解决的子问题。
+
+复杂问题的定义（满足以下任一条件即为复杂问题）：
+1. 包含多个子意图（如："帮我找北京的酒店和机票"）
+2. 需要推理或分析（如："为什么房价会上涨？"）
+3. 需要多步骤解决（如："如何从零开始学习Python并找到工作？"）
+4. 涉及因果关系或对比（如："比较Python和Java的优缺点"）
+5. 多款产品比较（如："iPhone 15和华为Mate 60哪个好？"）
+
+拆解要求（仅对复杂问题）：
+1. 每个子问题应该是独立、具体的，可以单独回答
+2. 子问题之间可以有依赖关系（用dependencies字段标明）
+3. 子问题的顺序应该符合逻辑
+4. 确保拆解后的子问题能够完整回答原问题
+
+输出字段：
+- is_complex: true/false，表示是否为复杂问题
+- reason: 判断理由
+- indicators: 检测到的复杂特征列表（简单问题则为空列表）
+- sub_problems: 拆解出的子问题列表（简单问题必须为空列表，不要输出多余内容）
+
+请分析以下问题：
+"""
+
+
+def build_complexity_prompt(query: str) -> str:
+    """
+    构建复杂度判断提示词（不变前缀 + 查询后缀）
+
+    Args:
+        query: 用户原始问题
+
+    Returns:
+        str: 完整提示词
+    """
+    return _COMPLEXITY_PROMPT_PREFIX + query
 
 
 class ComplexityCheckInput(BaseModel):
@@ -18,6 +106,27 @@ class ProblemDecomposeInput(BaseModel):
     query: str = Field(description="需要拆解的复杂问题")
 
 
+class CombinedAnalysisInput(BaseModel):
+    """综合分析工具的输入参数"""
+    query: str = Field(description="用户输入的原始问题")
+
+
+class SubProblem(BaseModel):
+    """拆解出的子问题"""
+    id: int = Field(description="子问题编号，从1开始")
+    content: str = Field(description="子问题内容")
+    type: str = Field(description="子问题类型：信息查询/比较分析/推理判断/建议推荐")
+    dependencies: List[int] = Field(default_factory=list, description="依赖的子问题ID列表，无依赖则为空")
+
+
+class AnalysisResult(BaseModel):
+    """复杂度判断 + 问题拆解的综合分析结果"""
+    is_complex: bool = Field(description="是否为复杂问题")
+    reason: str = Field(description="判断理由")
+    indicators: List[str] = Field(default_factory=list, description="检测到的复杂特征列表，简单问题则为空列表")
+    sub_problems: List[SubProblem] = Field(default_factory=list, description="拆解出的子问题列表，简单问题则为空列表")
+
+
 class ComplexityCheckTool(BaseTool):
     """
     问题复杂度判断工具
@@ -40,43 +149,44 @@ class ComplexityCheckTool(BaseTool):
     
     def _run(self, query: str) -> str:
         """执行复杂度判断"""
-        llm = Config.get_qwen_model(temperature=0.3)
-        
-        prompt = f"""你是一个问题复杂度分析专家。请判断以下问题是否为复杂问题。
-
-复杂问题的定义（满足以下任一条件即为复杂问题）：
-1. 包含多个子意图（如："帮我找北京的酒店和机票"）
-2. 需要推理或分析（如："为什么房价会上涨？"）
-3. 需要多步骤解决（如："如何从零开始学习Python并找到工作？"）
-4. 涉及因果关系或对比（如："比较Python和Java的优缺点"）
-5. 多款产品比较（如："iPhone 15和华为Mate 60哪个好？"）
+        cache = get_cache()
+        cache_key = cache.make_key(_COMPLEXITY_PROMPT_PREFIX, query,
+                                   Config.QWEN_MODEL, 0.0)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-请分析以下问题：
-{query}
+        # JSON 模式 + 限制解码长度，JSON 闭合后立即停止生成
+        llm = Config.get_qwen_model(temperature=0.0, response_format="json", max_tokens=256)
 
-请以JSON格式输出分析结果，包含以下字段：
-- is_complex: true/false，表示是否为复杂问题
-- reason: 判断理由（详细说明为什么认为该问题是复杂或简单的）
-- indicators: 检测到的复杂特征列表（如["多子意图", "产品比较"]等，简单问题则为空列表）
+        # 不变前缀 + 查询后缀，保证前缀 KV 缓存可复用
+        prompt = build_complexity_prompt(query)
 
-只输出JSON格式，不要包含其他说明文字。"""
-        
         response = llm.invoke(prompt)
-        
-        try:
-            result = json.loads(response.content)
-            return json.dumps(result, ensure_ascii=False, indent=2)
-        except json.JSONDecodeError:
-            return json.dumps({
-                "is_complex": False,
-                "reason": "解析失败，默认为简单问题",
-                "indicators": [],
-                "raw_response": response.content
-            }, ensure_ascii=False, indent=2)
-    
+
+        # JSON 模式下输出保证是合法 JSON，解析失败直接抛出
+        result_str = orjson.dumps(orjson.loads(response.content)).decode()
+        cache.put(cache_key, result_str)
+        return result_str
+
     async def _arun(self, query: str) -> str:
-        """异步执行（暂未实现）"""
-        raise NotImplementedError("异步执行暂未实现")
+        """异步执行复杂度判断（供批量测试等并发场景使用）"""
+        cache = get_cache()
+        cache_key = cache.make_key(_COMPLEXITY_PROMPT_PREFIX, query,
+                                   Config.QWEN_MODEL, 0.0)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        llm = Config.get_qwen_model(temperature=0.0, response_format="json", max_tokens=256)
+
+        prompt = build_complexity_prompt(query)
+
+        response = await llm.ainvoke(prompt)
+
+        result_str = orjson.dumps(orjson.loads(response.content)).decode()
+        cache.put(cache_key, result_str)
+        return result_str
 
 
 class ProblemDecomposeTool(BaseTool):
@@ -97,61 +207,77 @@ class ProblemDecomposeTool(BaseTool):
     
     def _run(self, query: str) -> str:
         """执行问题拆解"""
-        llm = Config.get_qwen_model(temperature=0.5)
-        
-        prompt = f"""你是一个问题拆解专家。请将以下复杂问题拆解为多个可独立解决的子问题。
+        # JSON 模式 + 限制解码长度，JSON 闭合后立即停止生成
+        llm = Config.get_qwen_model(temperature=0.0, response_format="json", max_tokens=1024)
 
-需要拆解的问题：
-{query}
+        # 不变前缀 + 查询后缀，保证前缀 KV 缓存可复用
+        prompt = _DECOMPOSE_PROMPT_PREFIX + query
 
-拆解要求：
-1. 每个子问题应该是独立、具体的，可以单独回答
-2. 子问题之间可以有依赖关系（用dependencies字段标明）
-3. 子问题的顺序应该符合逻辑
-4. 确保拆解后的子问题能够完整回答原问题
+        response = llm.invoke(prompt)
 
-请以JSON格式输出拆解结果，格式如下：
-{{
-    "sub_problems": [
-        {{
-            "id": 1,
-            "content": "子问题内容",
-            "type": "信息查询/比较分析/推理判断/建议推荐",
-            "dependencies": []  // 依赖的子问题ID列表，无依赖则为空
-        }}
-    ]
-}}
+        # JSON 模式下输出保证是合法 JSON，解析失败直接抛出
+        result = orjson.loads(response.content)
+        return orjson.dumps(result).decode()
+
+    async def _arun(self, query: str) -> str:
+        """异步执行问题拆解（供批量测试等并发场景使用）"""
+        llm = Config.get_qwen_model(temperature=0.0, response_format="json", max_tokens=1024)
+
+        prompt = _DECOMPOSE_PROMPT_PREFIX + query
+
+        response = await llm.ainvoke(prompt)
+
+        result = orjson.loads(response.content)
+        return orjson.dumps(result).decode()
+
+
+class CombinedAnalysisTool(BaseTool):
+    """
+    综合分析工具
+
+    将复杂度判断与问题拆解合并为一次 LLM 调用：
+    同样的工作量只需一次 prefill + decode，复杂问题的
+    端到端延迟约减半。
+    """
+
+    name: str = "combined_analysis"
+    description: str = """一次性完成问题复杂度判断和复杂问题拆解。
+    输入：用户原始查询
+    输出：{"is_complex": bool, "reason": str, "indicators": list, "sub_problems": list}
+
+    简单问题 sub_problems 为空列表；复杂问题附带拆解出的子问题。
+    """
+    args_schema: type[BaseModel] = CombinedAnalysisInput
+
+    def _run(self, query: str) -> str:
+        """执行综合分析"""
+        llm = Config.get_qwen_model(temperature=0.0)
+        structured_llm = llm.with_structured_output(AnalysisResult)
+
+        # 不变前缀 + 查询后缀，保证前缀 KV 缓存可复用
+        prompt = _COMBINED_PROMPT_PREFIX + query
+
+        result: AnalysisResult = structured_llm.invoke(prompt)
+        return orjson.dumps(result.model_dump()).decode()
 
-只输出JSON格式，不要包含其他说明文字。"""
-        
-        response = llm.invoke(prompt)
-        
-        try:
-            result = json.loads(response.content)
-            return json.dumps(result, ensure_ascii=False, indent=2)
-        except json.JSONDecodeError:
-            return json.dumps({
-                "sub_problems": [
-                    {
-                        "id": 1,
-                        "content": query,
-                        "type": "原始问题",
-                        "dependencies": [],
-                        "note": "解析失败，返回原始问题"
-                    }
-                ],
-                "raw_response": response.content
-            }, ensure_ascii=False, indent=2)
-    
     async def _arun(self, query: str) -> str:
-        """异步执行（暂未实现）"""
-        raise NotImplementedError("异步执行暂未实现")
+        """异步执行综合分析（供批量测试等并发场景使用）"""
+        llm = Config.get_qwen_model(temperature=0.0)
+        structured_llm = llm.with_structured_output(AnalysisResult)
+
+        prompt = _COMBINED_PROMPT_PREFIX + query
 
+        result: AnalysisResult = await structured_llm.ainvoke(prompt)
+        return orjson.dumps(result.model_dump()).decode()
 
+
+@functools.cache
 def get_tools() -> List[BaseTool]:
     """
     获取所有可用工具
-    
+
+    工具无状态，结果缓存后全局复用同一组实例。
+
     Returns:
         List[BaseTool]: 工具列表
     """